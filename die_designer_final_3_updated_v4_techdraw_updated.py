@@ -1,9 +1,80 @@
+import io
 import streamlit as st
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+import matplotlib.lines as mlines
+from matplotlib.colors import LightSource, Normalize, to_rgba
 import numpy as np
+import pandas as pd
 from mpl_toolkits.mplot3d import Axes3D
 
+# Cached geometry
+@st.cache_data(max_entries=32)
+def build_ring_coords(pcd_tuple, holes_tuple):
+    radii = np.asarray(pcd_tuple, dtype=float) / 2
+    xs, ys = [], []
+    for radius, holes in zip(radii, holes_tuple):
+        angles = 2 * np.pi * np.arange(holes, dtype=np.float64) / holes
+        xs.append(radius * np.cos(angles))
+        ys.append(radius * np.sin(angles))
+    return np.concatenate(xs), np.concatenate(ys)
+
+@st.cache_data(max_entries=32)
+def build_cone_mesh(cone_diameter, final_diameter, cone_length, plate_thickness):
+    # Both surfaces are ruled, so their two end rings describe them exactly
+    z_cone = np.array([0.0, cone_length], dtype=np.float32)
+    z_channel = np.array([cone_length, plate_thickness], dtype=np.float32)
+    theta = np.linspace(0, 2 * np.pi, 24, dtype=np.float32)
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+
+    z_frac = np.divide(z_cone, cone_length, out=np.zeros_like(z_cone), where=cone_length > 0)
+    r_cone = cone_diameter/2 - (cone_diameter - final_diameter)/2 * z_frac
+    x_cone = np.outer(r_cone, cos_t)
+    y_cone = np.outer(r_cone, sin_t)
+    z_cone_plot = np.broadcast_to(z_cone[:, np.newaxis], x_cone.shape)
+
+    r_channel = np.full_like(z_channel, final_diameter/2)
+    x_channel = np.outer(r_channel, cos_t)
+    y_channel = np.outer(r_channel, sin_t)
+    z_channel_plot = np.broadcast_to(z_channel[:, np.newaxis], x_channel.shape)
+    return x_cone, y_cone, z_cone_plot, x_channel, y_channel, z_channel_plot
+
+def surface_quads(x, y, z):
+    # One (4, 3) quad per grid cell, in the same order plot_surface(rstride=1, cstride=1) emits
+    grid = np.stack([x, y, z], axis=-1)
+    quads = np.stack([grid[:-1, :-1], grid[:-1, 1:], grid[1:, 1:], grid[1:, :-1]], axis=-2)
+    return quads.reshape(-1, 4, 3)
+
+# Light source mplot3d uses when shading plot_surface
+SURFACE_LIGHT = LightSource(azdeg=225, altdeg=19.4712)
+
+def shade_quads(quads, color):
+    # Same face shading plot_surface applies, so swapped-in geometry gets its own lighting
+    normals = np.cross(quads[:, 0] - quads[:, 1], quads[:, 1] - quads[:, 2])
+    with np.errstate(invalid='ignore'):
+        shade = (normals / np.linalg.norm(normals, axis=1, keepdims=True)) @ SURFACE_LIGHT.direction
+    shade = np.nan_to_num(shade)
+    colors = np.tile(to_rgba(color), (len(quads), 1))
+    colors[:, :3] *= Normalize(0.3, 1).inverse(Normalize(-1, 1)(shade))[:, np.newaxis]
+    return colors
+
+def cone_polygon_verts(cone_d, final_d, cone_len, plate_t):
+    return np.array([[-cone_d/2, 0], [-final_d/2, cone_len], [-final_d/2, plate_t],
+                     [final_d/2, plate_t], [final_d/2, cone_len], [cone_d/2, 0]])
+
+# The combined figure is created once per session and its axes are redrawn in place
+def session_figure():
+    if "figure" not in st.session_state:
+        fig = plt.figure(figsize=(10, 10), dpi=150)
+        gs = fig.add_gridspec(2, 2)
+        axes = (fig.add_subplot(gs[0, 0]), fig.add_subplot(gs[0, 1], projection='3d'),
+                fig.add_subplot(gs[1, 0]), fig.add_subplot(gs[1, 1]))
+        plt.close(fig)
+        st.session_state["figure"] = (fig, axes)
+    return st.session_state["figure"]
+
 # Title
 st.title("Die Designer")
 
@@ -15,30 +86,40 @@ final_fat = st.sidebar.slider("Final Fat (%)", 7, 44, 20, step=1)
 dry_meal_throughput = st.sidebar.slider("Dry Meal Throughput (tonne/h)", 0.4, 30.0, 10.0, step=0.1)
 
 # User Inputs
+# Kept outside the form so the channel length bound follows it live
 plate_thickness = st.slider("Total Plate Thickness (mm)", 1.0, 40.0, 20.0, step=0.5)
-final_diameter = st.slider("Final Hole Diameter (mm)", 0.3, 20.0, 10.0, step=0.05)
-cone_diameter = st.slider("Cone Opening Diameter (mm)", 0.3, 20.0, 15.0, step=0.05)
-channel_length = st.slider("Channel (Land) Length (mm)", 1.0, min(35.0, plate_thickness), 10.0, step=0.1)
-total_holes = st.number_input("Total Number of Holes Required", min_value=1, value=100)
-number_of_rows = st.number_input("Number of Rows", min_value=1, value=5)
-
-# PCD Inputs
-st.markdown("### Pitch Circle Diameters (PCD)")
-pcd_values = []
-holes_per_row_values = []
-for i in range(number_of_rows):
-    cols = st.columns(2)
-    with cols[0]:
-            pcd = st.slider(f"PCD for Row {i+1} (mm)", value=100.0, step=1.0)
-    with cols[1]:
-        holes = st.number_input(f"Holes in Row {i+1}", min_value=1, value=10)
-    pcd_values.append(pcd)
-    holes_per_row_values.append(holes)
+
+with st.form("params"):
+    final_diameter = st.slider("Final Hole Diameter (mm)", 0.3, 20.0, 10.0, step=0.05)
+    cone_diameter = st.slider("Cone Opening Diameter (mm)", 0.3, 20.0, 15.0, step=0.05)
+    channel_length = st.slider("Channel (Land) Length (mm)", 1.0, min(35.0, plate_thickness), 10.0, step=0.1)
+    total_holes = st.number_input("Total Number of Holes Required", min_value=1, value=100)
+    number_of_rows = st.number_input("Number of Rows", min_value=1, value=5)
+
+    # PCD Inputs
+    st.markdown("### Pitch Circle Diameters (PCD)")
+    default_df = pd.DataFrame({"PCD (mm)": [100.0] * number_of_rows, "Holes": [10] * number_of_rows})
+    edited = st.data_editor(default_df, num_rows="fixed", key="pcd_table", column_config={
+        "PCD (mm)": st.column_config.NumberColumn(min_value=0.0, step=1.0, required=True),
+        "Holes": st.column_config.NumberColumn(min_value=1, step=1, required=True)})
+    st.form_submit_button("Recompute")
+
+# Drop incomplete PCD rows; cleared cells come back from the table as NaN
+if edited.isna().to_numpy().any():
+    st.warning("Rows with an empty cell in the PCD table are ignored.")
+    edited = edited.dropna()
+if edited.empty:
+    st.error("Enter at least one complete row in the PCD table.")
+    st.stop()
+pcd_values = edited["PCD (mm)"].to_numpy()
+holes_per_row_values = edited["Holes"].to_numpy().astype(int)
 
 # Calculations
+pcd_arr = np.asarray(pcd_values, dtype=np.float64)
+pcd_max = pcd_arr.max()
 cone_length = plate_thickness - channel_length
 cone_radius = (cone_diameter - final_diameter) / 2
-cone_angle_rad = np.arctan(cone_radius / cone_length)
+cone_angle_rad = float(np.arctan2(cone_radius, cone_length))
 cone_angle_deg = np.degrees(cone_angle_rad)
 open_area_one_hole = np.pi * (final_diameter / 2) ** 2
 total_open_area = open_area_one_hole * total_holes
@@ -47,119 +128,105 @@ expansion = (1 - (final_diameter / pellet_size)) * 100
 
 # Display Outputs
 st.sidebar.markdown("### Calculated Outputs")
-st.sidebar.write(f"Cone Length: {cone_length:.2f} mm")
-st.sidebar.write(f"Cone Angle: {cone_angle_deg:.2f}°")
-st.sidebar.write(f"One Hole OA: {open_area_one_hole:.2f} mm²")
-st.sidebar.write(f"Total Plate OA: {total_open_area:.0f} mm²")
-st.sidebar.write(f"OA per tonne: {open_area_per_tonne:.0f} mm²/t/h")
-st.sidebar.write(f"Expansion: {expansion:.1f} %")
-
-# 2D Cross-Section Visualization
-fig, ax = plt.subplots(figsize=(1.4, 2.1), dpi=200)
-ax.set_xlim(-cone_diameter, cone_diameter)
-ax.set_ylim(0, plate_thickness + 5)
-ax.set_aspect('equal')
-
-# Cone section
-cone = patches.Polygon(
-[[-cone_diameter/2, 0], [-final_diameter/2, cone_length], [-final_diameter/2, plate_thickness],
-[final_diameter/2, plate_thickness], [final_diameter/2, cone_length], [cone_diameter/2, 0]],
-closed=True, facecolor='white', edgecolor='black', hatch='///', linewidth=1.0)
-    [[-cone_diameter/2, 0], [-final_diameter/2, cone_length], [-final_diameter/2, plate_thickness],
-     [final_diameter/2, plate_thickness], [final_diameter/2, cone_length], [cone_diameter/2, 0]],
-    closed=True, color='lightblue', edgecolor='black')
-ax.add_patch(cone)
-
-# Channel section
-channel = patches.Rectangle((-final_diameter/2, cone_length), final_diameter, channel_length,
-facecolor='white', edgecolor='black', hatch='...', linewidth=1.0)
-                            color='lightgreen', edgecolor='black')
-ax.add_patch(channel)
-
-ax.axis('off')
-st.pyplot(fig)
-
-# 3D Visualization
-fig3d = plt.figure(figsize=(3, 3))
-ax3d = fig3d.add_subplot(111, projection='3d')
-z_cone = np.linspace(0, cone_length, 30)
-z_channel = np.linspace(cone_length, plate_thickness, 10)
-theta = np.linspace(0, 2 * np.pi, 30)
-theta_grid, z_cone_grid = np.meshgrid(theta, z_cone)
-theta_grid2, z_channel_grid = np.meshgrid(theta, z_channel)
-
-r_cone = (cone_diameter/2 - (cone_diameter - final_diameter)/2 * (z_cone / cone_length))
-x_cone = r_cone[:, np.newaxis] * np.cos(theta_grid)
-y_cone = r_cone[:, np.newaxis] * np.sin(theta_grid)
-z_cone_plot = z_cone_grid
-
-r_channel = np.full_like(z_channel, final_diameter/2)
-x_channel = r_channel[:, np.newaxis] * np.cos(theta_grid2)
-y_channel = r_channel[:, np.newaxis] * np.sin(theta_grid2)
-z_channel_plot = z_channel_grid
-
-ax3d.plot_surface(x_cone, y_cone, z_cone_plot, color='lightblue', alpha=0.8)
-ax3d.plot_surface(x_channel, y_channel, z_channel_plot, color='lightgreen', alpha=0.8)
-ax3d.set_xlabel("X (mm)")
-ax3d.set_ylabel("Y (mm)")
-ax3d.set_zlabel("Depth (mm)")
-st.pyplot(fig3d)
-
-# Ring Layout Visualization
-fig_ring, ax_ring = plt.subplots(figsize=(3, 3), dpi=200)
-ax_ring.set_aspect('equal')
-ax_ring.set_title("Die Hole Layout")
-for row in range(number_of_rows):
-    radius = pcd_values[row] / 2
-    for i in range(holes_per_row_values[row]):
-        angle = 2 * np.pi * i / holes_per_row_values[row]
-        x = radius * np.cos(angle)
-        y = radius * np.sin(angle)
-        hole = patches.Circle((x, y), final_diameter / 2, color='gray', edgecolor='black')
-        ax_ring.add_patch(hole)
-    ax_ring.set_xlim(-radius - 10, radius + 10)
-    ax_ring.set_ylim(-radius - 10, radius + 10)
-ax_ring.axis('off')
-st.pyplot(fig_ring)
-
-
-# --- Technical Drawing Section ---
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
-import matplotlib.lines as mlines
-import numpy as np
-
-# Parameters for drawing
-fig, ax = plt.subplots(figsize=(6, 8), dpi=200)
-ax.set_xlim(-20, 20)
-ax.set_ylim(-5, plate_thickness + 10)
-ax.set_aspect('equal')
-ax.axis('off')
-
-# Draw cone section
-cone = patches.Polygon(
-[[-cone_diameter/2, 0], [-final_diameter/2, cone_length], [-final_diameter/2, plate_thickness],
-[final_diameter/2, plate_thickness], [final_diameter/2, cone_length], [cone_diameter/2, 0]],
-closed=True, facecolor='white', edgecolor='black', hatch='///', linewidth=1.0)
-    [[-cone_diameter/2, 0], [-final_diameter/2, cone_length], [-final_diameter/2, plate_thickness],
-     [final_diameter/2, plate_thickness], [final_diameter/2, cone_length], [cone_diameter/2, 0]],
-    closed=True, color='white', edgecolor='black', linewidth=1.0
-)
-ax.add_patch(cone)
-ax.add_line(mlines.Line2D([0, 0], [-5, plate_thickness + 5], color='gray', linestyle='--', linewidth=0.8))
-
-def draw_dimension(x1, y1, x2, y2, text, offset=2, vertical=True):
-    if vertical:
-        ax.annotate('', xy=(x1, y1), xytext=(x1, y2),
-                    arrowprops=dict(arrowstyle='<->', color='black'))
-        ax.text(x1 + offset, (y1 + y2) / 2, text, va='center', fontsize=8)
+outputs = pd.DataFrame({
+    "Metric": ["Cone Length (mm)", "Cone Angle (°)", "One Hole OA (mm²)",
+               "Total Plate OA (mm²)", "OA per tonne (mm²/t/h)", "Expansion (%)"],
+    "Value": [f"{cone_length:.2f}", f"{cone_angle_deg:.2f}", f"{open_area_one_hole:.2f}",
+              f"{total_open_area:.0f}", f"{open_area_per_tonne:.0f}", f"{expansion:.1f}"]})
+st.sidebar.table(outputs.set_index("Metric"))
+
+# Re-render the figure only when its geometry inputs change
+inputs_key = (plate_thickness, final_diameter, cone_diameter, channel_length,
+              tuple(pcd_values), tuple(holes_per_row_values))
+if st.session_state.get("last_key") != inputs_key:
+    fig, (ax_xs, ax3d, ax_ring, ax_tech) = session_figure()
+    cone_verts = cone_polygon_verts(cone_diameter, final_diameter, cone_length, plate_thickness)
+
+    # 2D Cross-Section Visualization
+    ax_xs.clear()
+    ax_xs.set_xlim(-cone_diameter, cone_diameter)
+    ax_xs.set_ylim(0, plate_thickness + 5)
+    ax_xs.set_aspect('equal')
+
+    # Cone section
+    ax_xs.fill(cone_verts[:, 0], cone_verts[:, 1], facecolor='white', edgecolor='black', hatch='///', linewidth=1.0)
+
+    # Channel section
+    ax_xs.fill([-final_diameter/2, final_diameter/2, final_diameter/2, -final_diameter/2],
+               [cone_length, cone_length, plate_thickness, plate_thickness], facecolor='white', edgecolor='black', hatch='...', linewidth=1.0)
+
+    ax_xs.axis('off')
+
+    # 3D Visualization
+    x_cone, y_cone, z_cone_plot, x_channel, y_channel, z_channel_plot = build_cone_mesh(
+        cone_diameter, final_diameter, cone_length, plate_thickness)
+
+    if "three_d" not in st.session_state:
+        cone_surf = ax3d.plot_surface(x_cone, y_cone, z_cone_plot, rstride=1, cstride=1,
+                                      color='lightblue', alpha=0.8, rasterized=True)
+        channel_surf = ax3d.plot_surface(x_channel, y_channel, z_channel_plot, rstride=1, cstride=1,
+                                         color='lightgreen', alpha=0.8, rasterized=True)
+        ax3d.set_xlabel("X (mm)")
+        ax3d.set_ylabel("Y (mm)")
+        ax3d.set_zlabel("Depth (mm)")
+        st.session_state["three_d"] = (cone_surf, channel_surf)
     else:
-        ax.annotate('', xy=(x1, y1), xytext=(x2, y1),
-                    arrowprops=dict(arrowstyle='<->', color='black'))
-        ax.text((x1 + x2) / 2, y1 + offset, text, ha='center', fontsize=8)
-
-draw_dimension(final_diameter/2 + 2, 0, final_diameter/2 + 2, cone_length, f'Cone Length: {cone_length:.1f} mm')
-draw_dimension(final_diameter/2 + 2, cone_length, final_diameter/2 + 2, plate_thickness, f'Channel Length: {channel_length:.1f} mm')
-draw_dimension(-cone_diameter/2, -2, cone_diameter/2, -2, f'Cone Ø: {cone_diameter:.1f} mm', offset=1, vertical=False)
-draw_dimension(-final_diameter/2, plate_thickness + 2, final_diameter/2, plate_thickness + 2, f'Hole Ø: {final_diameter:.1f} mm', offset=1, vertical=False)
-st.pyplot(fig)
+        # Reuse the existing surfaces, swapping their vertex buffers and re-shading the faces
+        cone_surf, channel_surf = st.session_state["three_d"]
+        cone_quads = surface_quads(x_cone, y_cone, z_cone_plot)
+        channel_quads = surface_quads(x_channel, y_channel, z_channel_plot)
+        cone_surf.set_verts(cone_quads)
+        cone_surf.set_facecolor(shade_quads(cone_quads, 'lightblue'))
+        channel_surf.set_verts(channel_quads)
+        channel_surf.set_facecolor(shade_quads(channel_quads, 'lightgreen'))
+        ax3d.auto_scale_xyz(x_cone, y_cone, z_cone_plot, had_data=False)
+        ax3d.auto_scale_xyz(x_channel, y_channel, z_channel_plot, had_data=True)
+
+    # Ring Layout Visualization
+    ax_ring.clear()
+    ax_ring.set_aspect('equal')
+    ax_ring.set_title("Die Hole Layout")
+    xs, ys = build_ring_coords(tuple(pcd_values), tuple(holes_per_row_values))
+    ax_ring.set_xlim(-pcd_max/2 - 10, pcd_max/2 + 10)
+    ax_ring.set_ylim(-pcd_max/2 - 10, pcd_max/2 + 10)
+    # Marker size is in points², so convert the hole diameter from mm once the limits are fixed
+    ax_ring.apply_aspect()
+    points_per_mm = ax_ring.get_window_extent().width / (pcd_max + 20) * 72 / fig.dpi
+    hole_marker_size = (final_diameter * points_per_mm) ** 2
+    ax_ring.scatter(xs, ys, s=hole_marker_size, c='gray', edgecolors='black', linewidths=0.5,
+                    rasterized=True)
+    ax_ring.axis('off')
+
+    # --- Technical Drawing Section ---
+    # Parameters for drawing
+    ax_tech.clear()
+    ax_tech.set_xlim(-20, 20)
+    ax_tech.set_ylim(-5, plate_thickness + 10)
+    ax_tech.set_aspect('equal')
+    ax_tech.axis('off')
+
+    # Draw cone section
+    ax_tech.fill(cone_verts[:, 0], cone_verts[:, 1], facecolor='white', edgecolor='black', hatch='///', linewidth=1.0)
+    ax_tech.add_line(mlines.Line2D([0, 0], [-5, plate_thickness + 5], color='gray', linestyle='--', linewidth=0.8))
+
+    def draw_dimension(x1, y1, x2, y2, text, offset=2, vertical=True):
+        if vertical:
+            ax_tech.annotate('', xy=(x1, y1), xytext=(x1, y2),
+                             arrowprops=dict(arrowstyle='<->', color='black'))
+            ax_tech.text(x1 + offset, (y1 + y2) / 2, text, va='center', fontsize=8)
+        else:
+            ax_tech.annotate('', xy=(x1, y1), xytext=(x2, y1),
+                             arrowprops=dict(arrowstyle='<->', color='black'))
+            ax_tech.text((x1 + x2) / 2, y1 + offset, text, ha='center', fontsize=8)
+
+    draw_dimension(final_diameter/2 + 2, 0, final_diameter/2 + 2, cone_length, f'Cone Length: {cone_length:.1f} mm')
+    draw_dimension(final_diameter/2 + 2, cone_length, final_diameter/2 + 2, plate_thickness, f'Channel Length: {channel_length:.1f} mm')
+    draw_dimension(-cone_diameter/2, -2, cone_diameter/2, -2, f'Cone Ø: {cone_diameter:.1f} mm', offset=1, vertical=False)
+    draw_dimension(-final_diameter/2, plate_thickness + 2, final_diameter/2, plate_thickness + 2, f'Hole Ø: {final_diameter:.1f} mm', offset=1, vertical=False)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    st.session_state["last_png"] = buf.getvalue()
+    st.session_state["last_key"] = inputs_key
+
+st.image(st.session_state["last_png"])
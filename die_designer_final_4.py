@@ -1,9 +1,37 @@
+import io
 import streamlit as st
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
 import numpy as np
+import pandas as pd
 from mpl_toolkits.mplot3d import Axes3D
 
+# Cached geometry
+@st.cache_data(max_entries=32)
+def build_ring_coords(pcd_tuple, holes_tuple):
+    radii = np.asarray(pcd_tuple, dtype=float) / 2
+    xs, ys = [], []
+    for radius, holes in zip(radii, holes_tuple):
+        angles = 2 * np.pi * np.arange(holes, dtype=np.float64) / holes
+        xs.append(radius * np.cos(angles))
+        ys.append(radius * np.sin(angles))
+    return np.concatenate(xs), np.concatenate(ys)
+
+def cone_polygon_verts(cone_d, final_d, cone_len, plate_t):
+    return np.array([[-cone_d/2, 0], [-final_d/2, cone_len], [-final_d/2, plate_t],
+                     [final_d/2, plate_t], [final_d/2, cone_len], [cone_d/2, 0]])
+
+# The combined figure is created once per session and its axes are redrawn in place
+def session_figure():
+    if "figure" not in st.session_state:
+        fig = plt.figure(figsize=(10, 5), dpi=150)
+        gs = fig.add_gridspec(1, 2)
+        axes = (fig.add_subplot(gs[0, 0]), fig.add_subplot(gs[0, 1]))
+        plt.close(fig)
+        st.session_state["figure"] = (fig, axes)
+    return st.session_state["figure"]
+
 # Title
 st.title("Die Designer")
 
@@ -15,30 +43,40 @@ final_fat = st.sidebar.slider("Final Fat (%)", 7, 44, 20, step=1)
 dry_meal_throughput = st.sidebar.slider("Dry Meal Throughput (tonne/h)", 0.4, 30.0, 10.0, step=0.1)
 
 # User Inputs
+# Kept outside the form so the channel length bound follows it live
 plate_thickness = st.slider("Total Plate Thickness (mm)", 1.0, 40.0, 20.0, step=0.5)
-final_diameter = st.slider("Final Hole Diameter (mm)", 0.3, 20.0, 10.0, step=0.05)
-cone_diameter = st.slider("Cone Opening Diameter (mm)", 0.3, 25.0, 12.0, step=0.05)
-channel_length = st.slider("Channel (Land) Length (mm)", 1.0, min(35.0, plate_thickness), 10.0, step=0.1)
-total_holes = st.number_input("Total Number of Holes Required", min_value=1, value=100)
-number_of_rows = st.number_input("Number of Rows", min_value=1, value=5)
-
-# PCD Inputs and Holes per Row
-st.markdown("### Pitch Circle Diameters (PCD) and Holes per Row")
-pcd_values = []
-holes_per_row_list = []
-for i in range(number_of_rows):
-    cols = st.columns(2)
-    with cols[0]:
-        pcd = st.slider(f"PCD for Row {i+1} (mm)", 50.0, 600.0, 100.0, step=1.0, label_visibility='visible')
-    with cols[1]:
-        holes = st.number_input(f"Holes in Row {i+1}", min_value=1, value=10, step=1)
-    pcd_values.append(pcd)
-    holes_per_row_list.append(holes)
+
+with st.form("params"):
+    final_diameter = st.slider("Final Hole Diameter (mm)", 0.3, 20.0, 10.0, step=0.05)
+    cone_diameter = st.slider("Cone Opening Diameter (mm)", 0.3, 25.0, 12.0, step=0.05)
+    channel_length = st.slider("Channel (Land) Length (mm)", 1.0, min(35.0, plate_thickness), 10.0, step=0.1)
+    total_holes = st.number_input("Total Number of Holes Required", min_value=1, value=100)
+    number_of_rows = st.number_input("Number of Rows", min_value=1, value=5)
+
+    # PCD Inputs and Holes per Row
+    st.markdown("### Pitch Circle Diameters (PCD) and Holes per Row")
+    default_df = pd.DataFrame({"PCD (mm)": [100.0] * number_of_rows, "Holes": [10] * number_of_rows})
+    edited = st.data_editor(default_df, num_rows="fixed", key="pcd_table", column_config={
+        "PCD (mm)": st.column_config.NumberColumn(min_value=50.0, max_value=600.0, step=1.0, required=True),
+        "Holes": st.column_config.NumberColumn(min_value=1, step=1, required=True)})
+    st.form_submit_button("Recompute")
+
+# Drop incomplete PCD rows; cleared cells come back from the table as NaN
+if edited.isna().to_numpy().any():
+    st.warning("Rows with an empty cell in the PCD table are ignored.")
+    edited = edited.dropna()
+if edited.empty:
+    st.error("Enter at least one complete row in the PCD table.")
+    st.stop()
+pcd_values = edited["PCD (mm)"].to_numpy()
+holes_per_row_list = edited["Holes"].to_numpy().astype(int)
 
 # Calculations
+pcd_arr = np.asarray(pcd_values, dtype=np.float64)
+pcd_max = pcd_arr.max()
 cone_length = plate_thickness - channel_length
 cone_radius = (cone_diameter - final_diameter) / 2
-cone_angle_rad = np.arctan(cone_radius / cone_length)
+cone_angle_rad = float(np.arctan2(cone_radius, cone_length))
 cone_angle_deg = np.degrees(cone_angle_rad)
 open_area_one_hole = np.pi * (final_diameter / 2) ** 2
 total_open_area = open_area_one_hole * total_holes
@@ -47,54 +85,58 @@ expansion = (1 - (final_diameter / pellet_size)) * 100
 
 # Display Outputs
 st.markdown("### Calculated Outputs")
-st.write(f"Cone Length: {cone_length:.2f} mm")
-st.write(f"Cone Angle: {cone_angle_deg:.2f}°")
-st.write(f"Open Area of One Hole: {open_area_one_hole:.2f} mm²")
-st.write(f"Total Plate Open Area: {total_open_area:.2f} mm²")
-st.write(f"Open Area per Tonne: {open_area_per_tonne:.2f} mm²/t/h")
-st.write(f"Expansion: {expansion:.2f} %")
-
-# 2D Cross-Section Visualization
-fig, ax = plt.subplots(figsize=(0.2, 0.3), dpi=300)
-ax.set_xlim(-cone_diameter, cone_diameter)
-ax.set_ylim(0, plate_thickness + 5)
-ax.set_aspect('equal')
-ax.axis('off')
-
-# Cone section
-cone = patches.Polygon(
-    [[-cone_diameter/2, 0], [-final_diameter/2, cone_length], [-final_diameter/2, plate_thickness],
-     [final_diameter/2, plate_thickness], [final_diameter/2, cone_length], [cone_diameter/2, 0]],
-    closed=True, color='lightblue', edgecolor='black')
-ax.add_patch(cone)
-
-# Channel section
-channel = patches.Rectangle((-final_diameter/2, cone_length), final_diameter, channel_length,
-                            color='lightgreen', edgecolor='black')
-ax.add_patch(channel)
-
-# Annotate values
-ax.text(cone_diameter/2 + 1, plate_thickness, f"Final Ø: {final_diameter:.2f} mm", fontsize=4)
-ax.text(cone_diameter/2 + 1, cone_length + channel_length/2, f"Channel: {channel_length:.2f} mm", fontsize=4)
-ax.text(cone_diameter/2 + 1, cone_length/2, f"Cone: {cone_length:.2f} mm", fontsize=4)
-ax.text(cone_diameter/2 + 1, cone_length/3, f"Angle: {cone_angle_deg:.1f}°", fontsize=4)
-
-st.pyplot(fig)
-
-# Ring Layout Visualization
-fig_ring, ax_ring = plt.subplots(figsize=(0.3, 0.3), dpi=300)
-ax_ring.set_aspect('equal')
-ax_ring.set_title("Die Hole Layout", fontsize=6)
-for row in range(number_of_rows):
-    radius = pcd_values[row] / 2
-    holes_in_row = holes_per_row_list[row]
-    for i in range(holes_in_row):
-        angle = 2 * np.pi * i / holes_in_row
-        x = radius * np.cos(angle)
-        y = radius * np.sin(angle)
-        hole = patches.Circle((x, y), final_diameter / 2, color='gray', edgecolor='black')
-        ax_ring.add_patch(hole)
-ax_ring.set_xlim(-max(pcd_values)/2 - 10, max(pcd_values)/2 + 10)
-ax_ring.set_ylim(-max(pcd_values)/2 - 10, max(pcd_values)/2 + 10)
-ax_ring.axis('off')
-st.pyplot(fig_ring)
+outputs = pd.DataFrame({
+    "Metric": ["Cone Length (mm)", "Cone Angle (°)", "Open Area of One Hole (mm²)",
+               "Total Plate Open Area (mm²)", "Open Area per Tonne (mm²/t/h)", "Expansion (%)"],
+    "Value": [f"{cone_length:.2f}", f"{cone_angle_deg:.2f}", f"{open_area_one_hole:.2f}",
+              f"{total_open_area:.2f}", f"{open_area_per_tonne:.2f}", f"{expansion:.2f}"]})
+st.table(outputs.set_index("Metric"))
+
+# Re-render the figure only when its geometry inputs change
+inputs_key = (plate_thickness, final_diameter, cone_diameter, channel_length,
+              tuple(pcd_values), tuple(holes_per_row_list))
+if st.session_state.get("last_key") != inputs_key:
+    fig, (ax_xs, ax_ring) = session_figure()
+    cone_verts = cone_polygon_verts(cone_diameter, final_diameter, cone_length, plate_thickness)
+
+    # 2D Cross-Section Visualization
+    ax_xs.clear()
+    ax_xs.set_xlim(-cone_diameter, cone_diameter)
+    ax_xs.set_ylim(0, plate_thickness + 5)
+    ax_xs.set_aspect('equal')
+    ax_xs.axis('off')
+
+    # Cone section
+    ax_xs.fill(cone_verts[:, 0], cone_verts[:, 1], facecolor='lightblue', edgecolor='black')
+
+    # Channel section
+    ax_xs.fill([-final_diameter/2, final_diameter/2, final_diameter/2, -final_diameter/2],
+               [cone_length, cone_length, plate_thickness, plate_thickness], facecolor='lightgreen', edgecolor='black')
+
+    # Annotate values
+    ax_xs.text(cone_diameter/2 + 1, plate_thickness, f"Final Ø: {final_diameter:.2f} mm")
+    ax_xs.text(cone_diameter/2 + 1, cone_length + channel_length/2, f"Channel: {channel_length:.2f} mm")
+    ax_xs.text(cone_diameter/2 + 1, cone_length/2, f"Cone: {cone_length:.2f} mm")
+    ax_xs.text(cone_diameter/2 + 1, cone_length/3, f"Angle: {cone_angle_deg:.1f}°")
+
+    # Ring Layout Visualization
+    ax_ring.clear()
+    ax_ring.set_aspect('equal')
+    ax_ring.set_title("Die Hole Layout")
+    xs, ys = build_ring_coords(tuple(pcd_values), tuple(holes_per_row_list))
+    ax_ring.set_xlim(-pcd_max/2 - 10, pcd_max/2 + 10)
+    ax_ring.set_ylim(-pcd_max/2 - 10, pcd_max/2 + 10)
+    # Marker size is in points², so convert the hole diameter from mm once the limits are fixed
+    ax_ring.apply_aspect()
+    points_per_mm = ax_ring.get_window_extent().width / (pcd_max + 20) * 72 / fig.dpi
+    hole_marker_size = (final_diameter * points_per_mm) ** 2
+    ax_ring.scatter(xs, ys, s=hole_marker_size, c='gray', edgecolors='black', linewidths=0.5,
+                    rasterized=True)
+    ax_ring.axis('off')
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    st.session_state["last_png"] = buf.getvalue()
+    st.session_state["last_key"] = inputs_key
+
+st.image(st.session_state["last_png"])
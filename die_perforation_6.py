@@ -1,42 +1,126 @@
+import io
 import streamlit as st
+import matplotlib
+matplotlib.use('Agg')
 import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+from matplotlib.colors import LightSource, Normalize, to_rgba
 import numpy as np
+import pandas as pd
 from mpl_toolkits.mplot3d import Axes3D
 
+# Cached geometry
+@st.cache_data(max_entries=32)
+def build_ring_coords(pcd_tuple, holes_tuple):
+    radii = np.asarray(pcd_tuple, dtype=float) / 2
+    xs, ys = [], []
+    for radius, holes in zip(radii, holes_tuple):
+        angles = 2 * np.pi * np.arange(holes, dtype=np.float64) / holes
+        xs.append(radius * np.cos(angles))
+        ys.append(radius * np.sin(angles))
+    return np.concatenate(xs), np.concatenate(ys)
+
+@st.cache_data(max_entries=32)
+def build_cone_mesh(cone_diameter, final_diameter, cone_length, plate_thickness):
+    # Both surfaces are ruled, so their two end rings describe them exactly
+    z_cone = np.array([0.0, cone_length], dtype=np.float32)
+    z_channel = np.array([cone_length, plate_thickness], dtype=np.float32)
+    theta = np.linspace(0, 2 * np.pi, 24, dtype=np.float32)
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+
+    z_frac = np.divide(z_cone, cone_length, out=np.zeros_like(z_cone), where=cone_length > 0)
+    r_cone = cone_diameter/2 - (cone_diameter - final_diameter)/2 * z_frac
+    x_cone = np.outer(r_cone, cos_t)
+    y_cone = np.outer(r_cone, sin_t)
+    z_cone_plot = np.broadcast_to(z_cone[:, np.newaxis], x_cone.shape)
+
+    r_channel = np.full_like(z_channel, final_diameter/2)
+    x_channel = np.outer(r_channel, cos_t)
+    y_channel = np.outer(r_channel, sin_t)
+    z_channel_plot = np.broadcast_to(z_channel[:, np.newaxis], x_channel.shape)
+    return x_cone, y_cone, z_cone_plot, x_channel, y_channel, z_channel_plot
+
+def surface_quads(x, y, z):
+    # One (4, 3) quad per grid cell, in the same order plot_surface(rstride=1, cstride=1) emits
+    grid = np.stack([x, y, z], axis=-1)
+    quads = np.stack([grid[:-1, :-1], grid[:-1, 1:], grid[1:, 1:], grid[1:, :-1]], axis=-2)
+    return quads.reshape(-1, 4, 3)
+
+# Light source mplot3d uses when shading plot_surface
+SURFACE_LIGHT = LightSource(azdeg=225, altdeg=19.4712)
+
+def shade_quads(quads, color):
+    # Same face shading plot_surface applies, so swapped-in geometry gets its own lighting
+    normals = np.cross(quads[:, 0] - quads[:, 1], quads[:, 1] - quads[:, 2])
+    with np.errstate(invalid='ignore'):
+        shade = (normals / np.linalg.norm(normals, axis=1, keepdims=True)) @ SURFACE_LIGHT.direction
+    shade = np.nan_to_num(shade)
+    colors = np.tile(to_rgba(color), (len(quads), 1))
+    colors[:, :3] *= Normalize(0.3, 1).inverse(Normalize(-1, 1)(shade))[:, np.newaxis]
+    return colors
+
+def cone_polygon_verts(cone_d, final_d, cone_len, plate_t):
+    return np.array([[-cone_d/2, 0], [-final_d/2, cone_len], [-final_d/2, plate_t],
+                     [final_d/2, plate_t], [final_d/2, cone_len], [cone_d/2, 0]])
+
+# The combined figure is created once per session and its axes are redrawn in place
+def session_figure():
+    if "figure" not in st.session_state:
+        fig = plt.figure(figsize=(15, 5), dpi=150)
+        gs = fig.add_gridspec(1, 3)
+        axes = (fig.add_subplot(gs[0, 0]), fig.add_subplot(gs[0, 1], projection='3d'),
+                fig.add_subplot(gs[0, 2]))
+        plt.close(fig)
+        st.session_state["figure"] = (fig, axes)
+    return st.session_state["figure"]
+
 st.set_page_config(layout="wide")
 st.title("Die Perforation Visualizer")
 
-# Target Inputs
-st.sidebar.header("Target Parameters")
-pellet_size = st.sidebar.slider("Pellet Size (mm)", 0.3, 20.0, 3.0, step=0.1)
-bulk_density = st.sidebar.slider("Bulk Density (g/l)", 300, 750, 500)
-final_fat = st.sidebar.slider("Final Fat (%)", 7, 44, 10)
-
-# Die Geometry Inputs
-st.sidebar.header("Die Geometry")
+# Kept outside the form so the channel length bound follows it live
 plate_thickness = st.sidebar.slider("Total Plate Thickness (mm)", 1.0, 40.0, 20.0, step=0.5)
-final_diameter = st.sidebar.slider("Final Hole Diameter (mm)", 0.3, 20.0, 3.0, step=0.05)
-cone_diameter = st.sidebar.slider("Cone Opening Diameter (mm)", 0.3, 25.0, 6.0, step=0.05)
-channel_length = st.sidebar.slider("Channel (Land) Length (mm)", 0.1, min(35.0, plate_thickness), 5.0, step=0.1)
-
-# Hole Layout Inputs
-st.sidebar.header("Hole Layout")
-total_holes = st.sidebar.number_input("Total Number of Holes Required", min_value=1, value=100)
-dry_meal_throughput = st.sidebar.number_input("Dry Meal Throughput (tonne/h)", min_value=0.1, value=10.0)
-number_of_rows = st.sidebar.number_input("Number of Rows", min_value=1, value=5)
-
-# PCD Inputs
-st.sidebar.header("Pitch Circle Diameters (PCD)")
-pcd_values = []
-for i in range(number_of_rows):
-    pcd = st.sidebar.slider(f"PCD for Row {i+1} (mm)", 50.0, 600.0, 100.0, step=1.0)
-    pcd_values.append(pcd)
+
+with st.sidebar.form("params"):
+    # Target Inputs
+    st.header("Target Parameters")
+    pellet_size = st.slider("Pellet Size (mm)", 0.3, 20.0, 3.0, step=0.1)
+    bulk_density = st.slider("Bulk Density (g/l)", 300, 750, 500)
+    final_fat = st.slider("Final Fat (%)", 7, 44, 10)
+
+    # Die Geometry Inputs
+    st.header("Die Geometry")
+    final_diameter = st.slider("Final Hole Diameter (mm)", 0.3, 20.0, 3.0, step=0.05)
+    cone_diameter = st.slider("Cone Opening Diameter (mm)", 0.3, 25.0, 6.0, step=0.05)
+    channel_length = st.slider("Channel (Land) Length (mm)", 0.1, min(35.0, plate_thickness), 5.0, step=0.1)
+
+    # Hole Layout Inputs
+    st.header("Hole Layout")
+    total_holes = st.number_input("Total Number of Holes Required", min_value=1, value=100)
+    dry_meal_throughput = st.number_input("Dry Meal Throughput (tonne/h)", min_value=0.1, value=10.0)
+    number_of_rows = st.number_input("Number of Rows", min_value=1, value=5)
+
+    # PCD Inputs
+    st.header("Pitch Circle Diameters (PCD)")
+    default_df = pd.DataFrame({"PCD (mm)": [100.0] * number_of_rows})
+    edited = st.data_editor(default_df, num_rows="fixed", key="pcd_table", column_config={
+        "PCD (mm)": st.column_config.NumberColumn(min_value=50.0, max_value=600.0, step=1.0, required=True)})
+    st.form_submit_button("Recompute")
+
+# Drop incomplete PCD rows; cleared cells come back from the table as NaN
+if edited.isna().to_numpy().any():
+    st.warning("Rows with an empty cell in the PCD table are ignored.")
+    edited = edited.dropna()
+if edited.empty:
+    st.error("Enter at least one complete row in the PCD table.")
+    st.stop()
+pcd_values = edited["PCD (mm)"].to_numpy()
 
 # Calculated Outputs
+pcd_arr = np.asarray(pcd_values, dtype=np.float64)
+pcd_max = pcd_arr.max()
 cone_length = plate_thickness - channel_length
 cone_radius = abs((cone_diameter - final_diameter) / 2)
-cone_angle_rad = np.arctan(cone_radius / cone_length) if cone_length > 0 else 0
+cone_angle_rad = float(np.arctan2(cone_radius, cone_length))
 cone_angle_deg = np.degrees(cone_angle_rad)
 holes_per_row = int(total_holes / number_of_rows)
 open_area_one_hole = np.pi * (final_diameter / 2) ** 2
@@ -45,97 +129,91 @@ open_area_per_tonne = total_open_area / dry_meal_throughput
 expansion = (1 - (final_diameter / pellet_size)) * 100 if pellet_size > 0 else 0
 
 # Calculate space between holes (edge-to-edge) for each row
-space_between_holes_list = []
-for pcd in pcd_values:
-    radius = pcd / 2
-    arc_length = 2 * np.pi * radius / holes_per_row
-    spacing = arc_length - final_diameter
-    space_between_holes_list.append(spacing)
+arc_lengths = np.pi * pcd_arr / holes_per_row
+space_between_holes_arr = arc_lengths - final_diameter
 
 # Calculate space between rows from PCDs
-space_between_rows = np.mean(np.diff(sorted(pcd_values))) if len(pcd_values) > 1 else 0
+space_between_rows = np.mean(np.diff(np.sort(pcd_arr))) if len(pcd_arr) > 1 else 0
 
 # Display Outputs
 st.subheader("Calculated Outputs")
-col1, col2 = st.columns(2)
-with col1:
-    st.write(f"Cone Length: {cone_length:.2f} mm")
-    st.write(f"Cone Angle: {cone_angle_deg:.2f}°")
-    st.write(f"Open Area of One Hole: {open_area_one_hole:.2f} mm²")
-    st.write(f"Total Plate Open Area: {total_open_area:.2f} mm²")
-    st.write(f"Open Area per Tonne: {open_area_per_tonne:.2f} mm²/t/h")
-with col2:
-    st.write(f"Number of Holes per Row: {holes_per_row}")
-    for i, spacing in enumerate(space_between_holes_list):
-        st.write(f"Row {i+1} - Space Between Holes: {spacing:.2f} mm")
-    st.write(f"Space Between Rows (calculated): {space_between_rows:.2f} mm")
-    st.write(f"Expansion: {expansion:.2f} %")
-
-# 2D Cross-Section Visualization
-fig2d, ax2d = plt.subplots(figsize=(4, 6))
-ax2d.set_xlim(-cone_diameter, cone_diameter)
-ax2d.set_ylim(0, plate_thickness + 5)
-ax2d.set_aspect('equal')
-
-# Cone section
-cone_patch = patches.Polygon([
-    [-cone_diameter/2, 0],
-    [-final_diameter/2, cone_length],
-    [-final_diameter/2, plate_thickness],
-    [final_diameter/2, plate_thickness],
-    [final_diameter/2, cone_length],
-    [cone_diameter/2, 0]
-], closed=True, facecolor='lightblue', edgecolor='black', label='Cone')
-
-# Channel section
-channel_patch = patches.Rectangle((-final_diameter/2, cone_length), final_diameter, channel_length,
-                                  facecolor='lightgreen', edgecolor='black', label='Channel')
-
-ax2d.add_patch(cone_patch)
-ax2d.add_patch(channel_patch)
-ax2d.set_xlabel("Width (mm)")
-ax2d.set_ylabel("Depth (mm)")
-ax2d.legend()
-st.pyplot(fig2d)
-
-# 3D Visualization
-fig3d = plt.figure(figsize=(6, 6))
-ax3d = fig3d.add_subplot(111, projection='3d')
-z_cone = np.linspace(0, cone_length, 30)
-z_channel = np.linspace(cone_length, plate_thickness, 10)
-theta = np.linspace(0, 2 * np.pi, 30)
-theta_grid, z_cone_grid = np.meshgrid(theta, z_cone)
-theta_grid2, z_channel_grid = np.meshgrid(theta, z_channel)
-
-r_cone = (cone_diameter/2 - (cone_diameter - final_diameter)/2 * (z_cone / cone_length)) if cone_length > 0 else np.full_like(z_cone, final_diameter/2)
-x_cone = r_cone[:, np.newaxis] * np.cos(theta_grid)
-y_cone = r_cone[:, np.newaxis] * np.sin(theta_grid)
-z_cone_plot = z_cone_grid
-
-r_channel = np.full_like(z_channel, final_diameter/2)
-x_channel = r_channel[:, np.newaxis] * np.cos(theta_grid2)
-y_channel = r_channel[:, np.newaxis] * np.sin(theta_grid2)
-z_channel_plot = z_channel_grid
-
-ax3d.plot_surface(x_cone, y_cone, z_cone_plot, color='lightblue', alpha=0.8)
-ax3d.plot_surface(x_channel, y_channel, z_channel_plot, color='lightgreen', alpha=0.8)
-ax3d.set_xlabel("X (mm)")
-ax3d.set_ylabel("Y (mm)")
-ax3d.set_zlabel("Depth (mm)")
-st.pyplot(fig3d)
-
-# Ring Layout Visualization
-fig_ring, ax_ring = plt.subplots(figsize=(6, 6))
-ax_ring.set_aspect('equal')
-for row, pcd in enumerate(pcd_values):
-    radius = pcd / 2
-    for i in range(holes_per_row):
-        angle = 2 * np.pi * i / holes_per_row
-        x = radius * np.cos(angle)
-        y = radius * np.sin(angle)
-        hole = patches.Circle((x, y), final_diameter / 2, color='gray', edgecolor='black')
-        ax_ring.add_patch(hole)
-    ax_ring.set_xlim(-radius - 10, radius + 10)
-    ax_ring.set_ylim(-radius - 10, radius + 10)
-ax_ring.axis('off')
-st.pyplot(fig_ring)
+outputs = pd.DataFrame({
+    "Metric": ["Cone Length (mm)", "Cone Angle (°)", "Open Area of One Hole (mm²)",
+               "Total Plate Open Area (mm²)", "Open Area per Tonne (mm²/t/h)", "Number of Holes per Row"]
+              + [f"Row {i+1} - Space Between Holes (mm)" for i in range(len(space_between_holes_arr))]
+              + ["Space Between Rows (calculated) (mm)", "Expansion (%)"],
+    "Value": [f"{cone_length:.2f}", f"{cone_angle_deg:.2f}", f"{open_area_one_hole:.2f}",
+              f"{total_open_area:.2f}", f"{open_area_per_tonne:.2f}", f"{holes_per_row}"]
+             + [f"{spacing:.2f}" for spacing in space_between_holes_arr.tolist()]
+             + [f"{space_between_rows:.2f}", f"{expansion:.2f}"]})
+st.table(outputs.set_index("Metric"))
+
+# Re-render the figure only when its geometry inputs change
+inputs_key = (plate_thickness, final_diameter, cone_diameter, channel_length,
+              tuple(pcd_values), holes_per_row)
+if st.session_state.get("last_key") != inputs_key:
+    fig, (ax_xs, ax3d, ax_ring) = session_figure()
+    cone_verts = cone_polygon_verts(cone_diameter, final_diameter, cone_length, plate_thickness)
+
+    # 2D Cross-Section Visualization
+    ax_xs.clear()
+    ax_xs.set_xlim(-cone_diameter, cone_diameter)
+    ax_xs.set_ylim(0, plate_thickness + 5)
+    ax_xs.set_aspect('equal')
+
+    # Cone section
+    ax_xs.fill(cone_verts[:, 0], cone_verts[:, 1], facecolor='lightblue', edgecolor='black', label='Cone')
+
+    # Channel section
+    ax_xs.fill([-final_diameter/2, final_diameter/2, final_diameter/2, -final_diameter/2],
+               [cone_length, cone_length, plate_thickness, plate_thickness], facecolor='lightgreen', edgecolor='black', label='Channel')
+
+    ax_xs.set_xlabel("Width (mm)")
+    ax_xs.set_ylabel("Depth (mm)")
+    ax_xs.legend()
+
+    # 3D Visualization
+    x_cone, y_cone, z_cone_plot, x_channel, y_channel, z_channel_plot = build_cone_mesh(
+        cone_diameter, final_diameter, cone_length, plate_thickness)
+
+    if "three_d" not in st.session_state:
+        cone_surf = ax3d.plot_surface(x_cone, y_cone, z_cone_plot, rstride=1, cstride=1,
+                                      color='lightblue', alpha=0.8, rasterized=True)
+        channel_surf = ax3d.plot_surface(x_channel, y_channel, z_channel_plot, rstride=1, cstride=1,
+                                         color='lightgreen', alpha=0.8, rasterized=True)
+        ax3d.set_xlabel("X (mm)")
+        ax3d.set_ylabel("Y (mm)")
+        ax3d.set_zlabel("Depth (mm)")
+        st.session_state["three_d"] = (cone_surf, channel_surf)
+    else:
+        # Reuse the existing surfaces, swapping their vertex buffers and re-shading the faces
+        cone_surf, channel_surf = st.session_state["three_d"]
+        cone_quads = surface_quads(x_cone, y_cone, z_cone_plot)
+        channel_quads = surface_quads(x_channel, y_channel, z_channel_plot)
+        cone_surf.set_verts(cone_quads)
+        cone_surf.set_facecolor(shade_quads(cone_quads, 'lightblue'))
+        channel_surf.set_verts(channel_quads)
+        channel_surf.set_facecolor(shade_quads(channel_quads, 'lightgreen'))
+        ax3d.auto_scale_xyz(x_cone, y_cone, z_cone_plot, had_data=False)
+        ax3d.auto_scale_xyz(x_channel, y_channel, z_channel_plot, had_data=True)
+
+    # Ring Layout Visualization
+    ax_ring.clear()
+    ax_ring.set_aspect('equal')
+    xs, ys = build_ring_coords(tuple(pcd_values), (holes_per_row,) * len(pcd_values))
+    ax_ring.set_xlim(-pcd_max/2 - 10, pcd_max/2 + 10)
+    ax_ring.set_ylim(-pcd_max/2 - 10, pcd_max/2 + 10)
+    # Marker size is in points², so convert the hole diameter from mm once the limits are fixed
+    ax_ring.apply_aspect()
+    points_per_mm = ax_ring.get_window_extent().width / (pcd_max + 20) * 72 / fig.dpi
+    hole_marker_size = (final_diameter * points_per_mm) ** 2
+    ax_ring.scatter(xs, ys, s=hole_marker_size, c='gray', edgecolors='black', linewidths=0.5,
+                    rasterized=True)
+    ax_ring.axis('off')
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', bbox_inches='tight')
+    st.session_state["last_png"] = buf.getvalue()
+    st.session_state["last_key"] = inputs_key
+
+st.image(st.session_state["last_png"])